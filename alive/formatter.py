@@ -4,8 +4,16 @@
 from . import language as L
 from .util import pretty
 from .util.dispatch import singledispatch
-import collections
-import itertools
+import re
+
+__all__ = ('get_insts', 'format_parts', 'Formatted', 'Formatter', 'format_doc',
+  'text_events_line_continue')
+
+# Docs shared by the formatters in this module
+_empty = pretty.seq()
+_space = pretty.text(' ')
+_and_sep = pretty.seq(pretty.line, '&& ')
+_or_sep = pretty.seq(pretty.line, '|| ')
 
 def get_insts(v):
   def walk(v, insts, seen):
@@ -35,11 +43,11 @@ def format_parts(name, headers, src, tgt, fmt = None):
 
   srci = [(fmt.name(i), format_doc(i, fmt, 0)) for i in get_insts(src)]
   cdefs = [(fmt.name(v), format_doc(v, fmt, 0))
-              for v in L.constant_defs(tgt, map(lambda h: h[1], headers))]
+              for v in L.constant_defs(tgt, [h[1] for h in headers])]
 
-  heads = pretty.iter_seq(
+  heads = pretty.iter_seq([
     pretty.seq(h, ' ', format_doc(t, fmt, 0).nest(len(h)+1), pretty.line)
-    for h,t in headers)
+    for h,t in headers])
 
   if isinstance(tgt, L.Instruction):
     fmt.ids[tgt] = fmt.name(src)
@@ -50,22 +58,24 @@ def format_parts(name, headers, src, tgt, fmt = None):
   tgti.append((fmt.name(src), format_doc(tgt, fmt, 0)))
 
   # now, find the longest instruction or cdef name
-  name_width = max(map(lambda d: len(d[0]), itertools.chain(srci, cdefs, tgti)))
+  name_width = max(len(d[0]) for ds in (srci, cdefs, tgti) for d in ds)
   nest = name_width + 3
 
-  def fmt_decl((id,decl)):
-    return pretty.seq(id, ' ' * (name_width - len(id)), ' = ', decl).nest(nest)
+  def fmt_decl(item):
+    label, doc = item
+    return pretty.seq(label, ' ' * (name_width - len(label)), ' = ', doc) \
+      .nest(nest)
 
   return pretty.seq(
-    pretty.seq('Name: ', name, pretty.line) if name else pretty.seq(),
+    pretty.seq('Name: ', name, pretty.line) if name else _empty,
     heads,
     '  ',
-    pretty.line.join(map(fmt_decl, srci)).nest(2),
+    pretty.line.join(fmt_decl(d) for d in srci).nest(2),
     pretty.line,
     '=>',
     pretty.line,
     '  ',
-    pretty.line.join(map(fmt_decl, itertools.chain(cdefs, tgti))).nest(2),
+    pretty.line.join(fmt_decl(d) for d in cdefs + tgti).nest(2),
     pretty.line
   )
 
@@ -75,23 +85,32 @@ class Formatted(pretty.Doc):
   Formats using line continuations, so should not generally be combined with
   other Docs or used with the functions from pretty, e.g., pprint.
 
+  No formatting occurs until the Formatted is written or converted to a
+  string. When logging, pass it as an argument rather than formatting the
+  message directly, so that nothing is formatted if the level is disabled.
+
   Usage:
     Formatted(opt).write_to(sys.stdout)
     log.debug('expression: %s', Formatted(expr, indent=2))
   """
-  __slots__ = ('term', 'fmt', 'prec', 'kws')
+  __slots__ = ('term', 'fmt', 'prec', 'kws', '_doc')
   def __init__(self, term, formatter = None, prec = 0, **kws):
     self.term = term
     self.fmt = formatter or Formatter()
     self.prec = prec
     self.kws = kws
+    self._doc = term if isinstance(term, pretty.Doc) else None
 
   def send_to(self, out, indent):
-    format_doc(self.term, self.fmt, self.prec).send_to(out, indent)
+    # formatting assigns names in self.fmt, so only do it once
+    if self._doc is None:
+      self._doc = format_doc(self.term, self.fmt, self.prec)
+
+    self._doc.send_to(out, indent)
 
   def __str__(self):
-    import StringIO
-    sbuf = StringIO.StringIO()
+    import cStringIO
+    sbuf = cStringIO.StringIO()
     self.write_to(sbuf, **self.kws)
     return sbuf.getvalue()
 
@@ -104,10 +123,14 @@ class Formatted(pretty.Doc):
     it.close()
 
 
+# names which could also be generated by Formatter.name
+_fresh_name = re.compile(r'([C%])(0|[1-9][0-9]*)$')
+
 class Formatter(object):
   def __init__(self):
     self.ids = {}
     self.names = set()
+    self.reserved = set() # (prefix, number) pairs taken by given names
     self.fresh = 0
 
   def name(self, term):
@@ -116,15 +139,19 @@ class Formatter(object):
     """
     if term in self.ids: return self.ids[term]
 
-    prefix = 'C' if isinstance(term, L.Constant) else '%'
-
-    if isinstance(term, (L.Input, L.Instruction)) and term.name:
+    if isinstance(term, (L.Input, L.Instruction)) and term.name and \
+        term.name not in self.names:
       name = term.name
+      m = _fresh_name.match(name)
+      if m:
+        self.reserved.add((m.group(1), int(m.group(2))))
+
     else:
-      name = prefix + str(self.fresh)
-      self.fresh += 1
+      prefix = 'C' if isinstance(term, L.Constant) else '%'
+
+      while (prefix, self.fresh) in self.reserved:
+        self.fresh += 1
 
-    while name in self.names:
       name = prefix + str(self.fresh)
       self.fresh += 1
 
@@ -166,8 +193,8 @@ def _(term, fmt, prec):
     term.code,
     ' ',
     pretty.seq(
-      pretty.text(' ').join(term.flags),
-      ' ') if term.flags else pretty.seq(),
+      _space.join(term.flags),
+      ' ') if term.flags else _empty,
     fmt.operand(term.x, 0, term.ty),
     ',',
     pretty.line,
@@ -201,7 +228,7 @@ def _(term, fmt, prec):
 def _(term, fmt, prec):
   return pretty.group(
     'fcmp',
-    pretty.iter_seq(pretty.seq(' ', f) for f in term.flags),
+    pretty.iter_seq([pretty.seq(' ', f) for f in term.flags]),
     pretty.seq(' ', term.pred) if term.pred else '',
     pretty.line if term.flags or term.pred else ' ',
     fmt.operand(term.x, 0, term.ty),
@@ -252,33 +279,25 @@ _bin_cnxp_prec = {
 }
 _bin_cnxp_lassoc = {'-', '/', '/u', '%', '%u', '<<', '>>', 'u>>'}
 
-def _gather(term, prec, peers):
-  if not isinstance(term, L.BinaryCnxp) or prec != _bin_cnxp_prec[term]:
-    peers.append(term)
-    return
-
-  gather(term.x, prec, peers)
-
-
 @format_doc.register(L.BinaryCnxp)
 def _(term, fmt, prec):
-  peers = []
-
   op_prec = _bin_cnxp_prec[term.code]
+  prec_of = _bin_cnxp_prec.get
 
   def gather(term):
-    if not isinstance(term, L.BinaryCnxp) or \
-        op_prec != _bin_cnxp_prec[term.code]:
-      return fmt.operand(term, op_prec)
-
-    return pretty.seq(
-      gather(term.x),
-      pretty.line,
-      term.code,
-      ' ',
-      fmt.operand(term.y, op_prec)
-        if term.code in _bin_cnxp_lassoc
-        else gather(term.y))
+    # walk down the left spine, then emit the operands from left to right
+    spine = []
+    while isinstance(term, L.BinaryCnxp) and prec_of(term.code) == op_prec:
+      spine.append(term)
+      term = term.x
+
+    parts = [fmt.operand(term, op_prec)]
+    for t in reversed(spine):
+      parts.extend((pretty.line, t.code, ' ',
+        fmt.operand(t.y, op_prec) if t.code in _bin_cnxp_lassoc
+          else gather(t.y)))
+
+    return pretty.iter_seq(parts)
 
   body = gather(term)
 
@@ -297,8 +316,8 @@ def _(term, fmt, prec):
   return pretty.group(
     term.code,
     '(',
-    pretty.lbreak if term._args else pretty.seq(),
-    pretty.seq(',', pretty.line).join(fmt.operand(a, 0) for a in term._args),
+    pretty.lbreak if term._args else _empty,
+    pretty.commaline.join(fmt.operand(a, 0) for a in term._args),
     ')').nest(2)
 
 @format_doc.register(L.AndPred)
@@ -306,7 +325,7 @@ def _(term, fmt, prec):
   if not term.clauses:
     return pretty.text('true')
 
-  body = pretty.seq(pretty.line, '&& ').join(fmt.operand(a, 2).nest(3)
+  body = _and_sep.join(fmt.operand(a, 2).nest(3)
     for a in term.clauses)
 
   if prec > 2:
@@ -319,7 +338,7 @@ def _(term, fmt, prec):
   if not term.clauses:
     return pretty.text('!true')
 
-  body = pretty.seq(pretty.line, '|| ').join(fmt.operand(a, 1).nest(3)
+  body = _or_sep.join(fmt.operand(a, 1).nest(3)
     for a in term.clauses)
 
   if prec > 1:
@@ -162,6 +162,11 @@ class Node(pretty.PrettyRepr):
 #     key = tuple(getattr(self,s) for s in self.__slots__)
 #     h = hash(type(self)) ^ hash(key)
 #     return h
+#
+# Until then, nodes compare and hash by identity. Formatter.ids, the seen
+# sets used when walking DAGs, and the tables in typing all rely on this
+# being cheap; activating the structural versions above would make every
+# lookup recurse through the term.
 
   def args(self):
     return tuple(getattr(self,s) for s in self._allslots)
@@ -1080,12 +1085,26 @@ def subterms(term, seen = None):
   elif term in seen:
     return
 
-  for a in term.args():
-    for s in subterms(a, seen):
-      yield s
+  # done is pushed above a term whose args are being generated
+  done = object()
+  stack = [term]
+  pop = stack.pop
+  add = seen.add
+  while stack:
+    t = pop()
+    if t is done:
+      t = pop()
+      add(t)
+      yield t
 
-  seen.add(term)
-  yield term
+    elif t not in seen:
+      args = t.args()
+      if args:
+        stack += (t, done)
+        stack += args[::-1]
+      else:
+        add(t)
+        yield t
 
 def proper_subterms(term):
   seen = set()
@@ -1095,17 +1114,21 @@ def proper_subterms(term):
 
 def count_uses(dag, uses=None):
   """Count the number of times each subterm is referenced.
+
+  Returns a dict mapping each referenced subterm to its count. If uses is
+  provided, counts are added to it and subterms already in it are not walked.
   """
   if uses is None:
-    uses = collections.Counter()
+    uses = {}
 
-  def walk(v):
+  stack = [dag]
+  while stack:
+    v = stack.pop()
     for a in v.args():
       if a not in uses:
-        walk(a)
-      uses[a] += 1
+        stack.append(a)
+      uses[a] = uses.get(a, 0) + 1
 
-  walk(dag)
   return uses
 
 
@@ -1114,12 +1137,25 @@ def constant_defs(tgt, terms=[]):
 
   Terms are generated before any terms that reference them.
   """
-  uses = count_uses(tgt)
-  for t in terms:
-    count_uses(t, uses)
+  uses = collections.defaultdict(int)
+  seen = set()
+  consts = []
+
+  # visit each term once across all roots, counting its args as uses
+  for t in subterms(tgt, seen):
+    for a in t.args():
+      uses[a] += 1
+
+    if isinstance(t, Constant) and not isinstance(t, Symbol):
+      consts.append(t)
+
+  for p in terms:
+    for t in subterms(p, seen):
+      for a in t.args():
+        uses[a] += 1
 
-  for t in subterms(tgt):
-    if uses[t] > 1 and isinstance(t, Constant) and not isinstance(t, Symbol):
+  for t in consts:
+    if uses[t] > 1:
       yield t
 
 
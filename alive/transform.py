@@ -28,14 +28,21 @@ class Transform(pretty.PrettyRepr):
   def subterms(self):
     """Generate all terms in the transform, without repeats.
     """
+    try:
+      return iter(self._subterms)
+    except AttributeError:
+      pass
+
     seen = set()
 
-    return itertools.chain(
+    terms = tuple(itertools.chain(
       L.subterms(self.src, seen),
       L.subterms(self.tgt, seen),
       itertools.chain.from_iterable(L.subterms(p, seen) for p in self.pre),
       itertools.chain.from_iterable(L.subterms(p, seen) for p in self.asm),
-    )
+    ))
+    self._subterms = terms
+    return iter(terms)
 
   def type_constraints(self):
     logger.debug('%s: Gathering type constraints', self.name)
@@ -74,13 +81,39 @@ class Transform(pretty.PrettyRepr):
 
   @type_environment.deleter
   def type_environment(self):
-      try:
-        del self._env
-      except AttributeError:
-        pass
+      for attr in ('_env', '_models', '_model_gen'):
+        try:
+          delattr(self, attr)
+        except AttributeError:
+          pass
 
   def type_models(self):
-    return self.type_environment.models()
+    """Generate type models consistent with this opt.
+
+    Models are enumerated lazily and remembered as they are generated, so
+    later calls replay them before resuming the enumeration.
+    """
+    try:
+      models = self._models
+    except AttributeError:
+      models = []
+      self._models = models
+      self._model_gen = self.type_environment.models()
+
+    i = 0
+    while True:
+      while i < len(models):
+        yield models[i]
+        i += 1
+
+      if self._model_gen is None:
+        return
+
+      try:
+        models.append(self._model_gen.next())
+      except StopIteration:
+        self._model_gen = None
+        return
 
   def validate_model(self, type_vector):
     """Return whether the type vector meets this opt's constraints.
@@ -89,7 +122,17 @@ class Transform(pretty.PrettyRepr):
     if isinstance(type_vector, typing.TypeModel):
       type_vector = type_vector.types
 
-    V = typing.Validator(self.type_environment, type_vector)
+    env = self.type_environment
+
+    # reject vectors which do not fit the environment before checking each term
+    if len(type_vector) != env.tyvars:
+      return False
+
+    for con, ty in zip(env.constraint, type_vector):
+      if not typing.meets_constraint(con, ty):
+        return False
+
+    V = typing.Validator(env, type_vector)
 
     try:
       V.eq_types(self.src, self.tgt)
@@ -109,7 +152,7 @@ class Transform(pretty.PrettyRepr):
     Terms are generated before any terms that reference them.
     """
 
-    return constant_defs(self.tgt, self.pre + self.asm)
+    return L.constant_defs(self.tgt, self.pre + self.asm)
 
   def format(self):
     return Formatted(self)
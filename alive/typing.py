@@ -85,7 +85,7 @@ class TypeConstraints(object):
     self.ordering = set() # pairs (x,y) where width(x) < width(y)
     self.width_equalities = set() # pairs (x,y) where width(x) == width(y)
     self.default_rep = None
-    self.defaultable_reps = set()
+    self.defaultable_terms = []
     self.bound_reps = set()
 
   def collect(self, term, seen = None):
@@ -132,10 +132,6 @@ class TypeConstraints(object):
     if t2 is self.default_rep:
       self.default_rep = t1
 
-    if t2 in self.defaultable_reps:
-      self.defaultable_reps.remove(t2)
-      self.defaultable_reps.add(t1)
-
     if t2 in self.bound_reps:
       self.bound_reps.remove(t2)
       self.bound_reps.add(t1)
@@ -160,18 +156,33 @@ class TypeConstraints(object):
   def defaultable(self, term):
     """Mark this term as potentially having a default type.
     """
-    self.defaultable_reps.add(self.rep(term))
+    self.defaultable_terms.append(term)
+
+  def defaultable_reps(self):
+    """Return the set of reps containing a term marked as defaultable.
+    """
+    return set(self.rep(t) for t in self.defaultable_terms)
 
   def set_defaultables(self):
     """Set unbound, defaultable values to the default type. Raise an error if
     any unbound, non-defaultable values.
     """
-    for r in self.sets.reps():
-      if r in self.bound_reps or r in self.specifics or \
-          self.constraints[r] == BOOL:
+    # usually every value is bound, so only find the reps if needed
+    defaultable_reps = None
+
+    # default() merges reps, so work from a copy
+    unbound = set(self.sets.reps())
+    unbound -= self.bound_reps
+    unbound.difference_update(self.specifics)
+
+    for r in unbound:
+      if self.constraints[r] == BOOL:
         continue
 
-      if r in self.defaultable_reps:
+      if defaultable_reps is None:
+        defaultable_reps = self.defaultable_reps()
+
+      if r in defaultable_reps:
         self.default(r)
 
       else:
@@ -349,7 +360,8 @@ class TypeConstraints(object):
     min_width = {}
     for (lo,hi) in self.ordering:
       if isinstance(lo, int):
-        min_width[self.rep(hi)] = max(lo, min_width.get(hi,0))
+        r = self.rep(hi)
+        min_width[r] = max(lo, min_width.get(r,0))
 
     if logger.isEnabledFor(logging.DEBUG):
       logger.debug('get_type_model:\n  min_width: ' +
@@ -576,7 +588,7 @@ class TypeEnvironment(object):
     tc.collect(term)
 
     # check for defaultable terms
-    for rep in tc.defaultable_reps:
+    for rep in tc.defaultable_reps():
       if rep not in tc.rep_tyvar:
         tc.default(rep)
 
@@ -728,7 +740,7 @@ class Validator(object):
     self.type_vector = type_vector
 
   def type(self, term):
-    return self.type_vector[environment.vars[term]]
+    return self.type_vector[self.environment.vars[term]]
 
   def eq_types(self, *terms):
     it = iter(terms)
@@ -743,6 +755,10 @@ class Validator(object):
     if ty is not None and self.type(term) != ty:
       raise Error
 
+  def defaultable(self, term):
+    # only affects inference; any type in the vector is acceptable
+    pass
+
   def integer(self, term):
     if not isinstance(self.type(term), IntType):
       raise Error
@@ -29,20 +29,38 @@ __all__ = ('singledispatch', 'doubledispatch')
 
 import functools
 
+def _lookup(cls, registry):
+  """
+  Find the most specific implementation for cls in registry.
+  """
+
+  for k in cls.mro():
+    if k in registry:
+      return registry[k]
+
+  raise NotImplementedError
+
 def singledispatch(default):
+  """
+  Create a generic function which dispatches on the first argument.
+  """
+
   registry = {object: default}
+  cache = {}
 
   def dispatch(cls):
-    for k in cls.mro():
-      if k in registry:
-        return registry[k]
-
-    raise NotImplementedError
+    try:
+      return cache[cls]
+    except KeyError:
+      fun = _lookup(cls, registry)
+      cache[cls] = fun
+      return fun
 
   def register(cls, fun=None):
     if fun is None:
       return lambda f: register(cls, f)
 
+    cache.clear()
     registry[cls] = fun
     return fun
 